@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
 """
 Deploy Voice AI to Railway (no secrets in git)
+
+Sincronizează doar variabilele modificate, într-o singură mutație:
+  python3 deploy-voice-now.py            # sync (diff + batch upsert)
+  python3 deploy-voice-now.py --dry-run  # doar raport, fără scriere
+  python3 deploy-voice-now.py --mock     # test/timing offline pe un endpoint GraphQL local
 """
 
-import requests
+import argparse
 import json
 import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
+import requests
+
+API_URL = os.environ.get("RAILWAY_API_URL", "https://backboard.railway.app/graphql/v2")
 TOKEN = os.environ.get("RAILWAY_TOKEN")
 PROJECT_ID = os.environ.get("RAILWAY_PROJECT_ID")
 SERVICE_ID = os.environ.get("RAILWAY_SERVICE_ID") or PROJECT_ID
@@ -22,84 +34,269 @@ VARIABLES = {
     "PORT": os.environ.get("PORT", "5001"),
 }
 
-def railway_api(query):
-    """Call Railway GraphQL API"""
-    if not TOKEN:
-        raise RuntimeError("Missing RAILWAY_TOKEN env var")
-    response = requests.post(
-        "https://backboard.railway.app/graphql/v2",
-        headers={
-            "Authorization": f"Bearer {TOKEN}",
-            "Content-Type": "application/json"
-        },
-        json={"query": query}
-    )
-    return response.json()
-
-# Basic required args validation
-missing = []
-if not PROJECT_ID:
-    missing.append("RAILWAY_PROJECT_ID")
-if not VARIABLES.get("OPENAI_API_KEY"):
-    missing.append("OPENAI_API_KEY")
-if not VARIABLES.get("TWILIO_ACCOUNT_SID"):
-    missing.append("TWILIO_ACCOUNT_SID")
-if not VARIABLES.get("TWILIO_AUTH_TOKEN"):
-    missing.append("TWILIO_AUTH_TOKEN")
-if missing:
-    raise RuntimeError(f"Missing required env vars: {', '.join(missing)}")
-
-# Get environment ID
-print("🔍 Getting environment ID...")
-query = f"""
-query {{
-  project(id: "{PROJECT_ID}") {{
-    environments {{
-      edges {{
-        node {{
+REQUIRED = ["OPENAI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN"]
+
+ENVIRONMENTS_QUERY = """
+query environments($projectId: String!) {
+  project(id: $projectId) {
+    environments {
+      edges {
+        node {
           id
           name
-        }}
-      }}
-    }}
-  }}
-}}
+        }
+      }
+    }
+  }
+}
+"""
+
+VARIABLES_QUERY = """
+query variables($projectId: String!, $environmentId: String!) {
+  variables(projectId: $projectId, environmentId: $environmentId, unrendered: true)
+}
+"""
+
+UPSERT_MUTATION = """
+mutation variableCollectionUpsert($input: VariableCollectionUpsertInput!) {
+  variableCollectionUpsert(input: $input)
+}
 """
-result = railway_api(query)
-print(json.dumps(result, indent=2))
-
-if "errors" in result:
-    print("❌ Error getting environment")
-    print(result["errors"])
-    exit(1)
-
-# Get first environment
-env_id = result["data"]["project"]["environments"]["edges"][0]["node"]["id"]
-print(f"✅ Environment ID: {env_id}")
-
-# Add variables
-print("\n🔐 Adding variables...")
-for key, value in VARIABLES.items():
-    print(f"  ➕ {key}...")
-    query = f"""
-    mutation {{
-      variableUpsert(input: {{
-        projectId: "{PROJECT_ID}"
-        environmentId: "{env_id}"
-        name: "{key}"
-        value: "{value}"
-      }})
-    }}
-    """
-    result = railway_api(query)
+
+_session = None
+
+
+def get_session():
+    """Pooled HTTP session, reused for every Railway API call"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update({
+            "Authorization": f"Bearer {TOKEN}",
+            "Content-Type": "application/json"
+        })
+    return _session
+
+
+def railway_api(query, variables=None):
+    """Call Railway GraphQL API"""
+    if not TOKEN:
+        raise RuntimeError("Missing RAILWAY_TOKEN env var")
+    try:
+        response = get_session().post(
+            API_URL,
+            json={"query": query, "variables": variables or {}},
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # Erorile de transport ajung pe același drum ca erorile GraphQL
+        return {"errors": [{"message": str(e)}]}
+
+
+def get_environment_id():
+    result = railway_api(ENVIRONMENTS_QUERY, {"projectId": PROJECT_ID})
+    if "errors" in result:
+        print("❌ Error getting environment")
+        print(result["errors"])
+        sys.exit(1)
+    return result["data"]["project"]["environments"]["edges"][0]["node"]["id"]
+
+
+def get_current_variables(env_id):
+    result = railway_api(VARIABLES_QUERY, {"projectId": PROJECT_ID, "environmentId": env_id})
+    if "errors" in result:
+        print("❌ Error reading current variables")
+        print(result["errors"])
+        sys.exit(1)
+    return result["data"]["variables"] or {}
+
+
+def diff_variables(desired, current):
+    """Return (added, changed, unchanged) key lists; unset (None) values are ignored"""
+    added, changed, unchanged = [], [], []
+    for key, value in desired.items():
+        if value is None:
+            continue
+        if key not in current:
+            added.append(key)
+        elif current[key] != value:
+            changed.append(key)
+        else:
+            unchanged.append(key)
+    return added, changed, unchanged
+
+
+def upsert_variables(env_id, updates):
+    """Write all changed variables in one mutation (one redeploy at most)"""
+    result = railway_api(UPSERT_MUTATION, {
+        "input": {
+            "projectId": PROJECT_ID,
+            "environmentId": env_id,
+            "variables": updates,
+            "replace": False
+        }
+    })
     if "errors" in result:
         print(f"  ⚠️  Error: {result['errors']}")
-    else:
-        print(f"  ✅ Added")
-
-print("\n✅ All variables added!")
-print("\nAcum mergi în Railway Dashboard și:")
-print("1. Găsește serviciul web-production-f0714.up.railway.app")
-print("2. Settings → Source → Root Directory: voice-backend")
-print("3. Save")
-print("\nRailway va redeploya automat!")
+        return False
+    return True
+
+
+def validate():
+    missing = []
+    if not PROJECT_ID:
+        missing.append("RAILWAY_PROJECT_ID")
+    missing.extend(key for key in REQUIRED if not VARIABLES.get(key))
+    if missing:
+        raise RuntimeError(f"Missing required env vars: {', '.join(missing)}")
+
+
+def sync(dry_run=False):
+    """Return (ok, written): written is True only if the upsert was sent"""
+    print("🔍 Getting environment ID...")
+    env_id = get_environment_id()
+    print(f"✅ Environment ID: {env_id}")
+
+    print("\n📥 Reading current variables...")
+    current = get_current_variables(env_id)
+    added, changed, unchanged = diff_variables(VARIABLES, current)
+
+    for key in added:
+        print(f"  ➕ {key}")
+    for key in changed:
+        print(f"  ✏️  {key}")
+    for key in unchanged:
+        print(f"  ＝ {key}")
+
+    updates = {key: VARIABLES[key] for key in added + changed}
+    if not updates:
+        print("\n✅ Nothing to update, no redeploy triggered")
+        return True, False
+    if dry_run:
+        print(f"\n📝 Dry run: {len(updates)} variable(s) would be written")
+        return True, False
+
+    print(f"\n🔐 Writing {len(updates)} variable(s) in one batch...")
+    if not upsert_variables(env_id, updates):
+        return False, False
+    print("✅ Variables updated!")
+    return True, True
+
+
+class MockRailwayHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the Railway GraphQL API, backed by an in-memory store"""
+
+    # Keep-alive, ca sesiunea din get_session() să poată reutiliza conexiunea
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    store = {}
+    calls = 0
+    connections = 0
+    latency = 0.0
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        query = payload.get("query", "")
+        args = payload.get("variables") or {}
+        type(self).calls += 1
+        time.sleep(self.latency)
+
+        if "variableCollectionUpsert" in query:
+            data = args["input"]
+            env = self.store.setdefault(data["environmentId"], {})
+            if data.get("replace"):
+                env.clear()
+            env.update(data["variables"])
+            body = {"data": {"variableCollectionUpsert": True}}
+        elif "variables(" in query:
+            body = {"data": {"variables": dict(self.store.get(args["environmentId"], {}))}}
+        elif "environments" in query:
+            body = {"data": {"project": {"environments": {"edges": [
+                {"node": {"id": "mock-env", "name": "production"}}
+            ]}}}}
+        else:
+            body = {"errors": [{"message": "Unsupported operation"}]}
+
+        encoded = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_mock_server(latency=0.0):
+    MockRailwayHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockRailwayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_mock(dry_run, latency):
+    """Run the sync twice against a local mock to show request count and timing"""
+    global API_URL, TOKEN, PROJECT_ID
+    server = start_mock_server(latency)
+    API_URL = f"http://127.0.0.1:{server.server_address[1]}/graphql/v2"
+    TOKEN = TOKEN or "mock-token"
+    PROJECT_ID = PROJECT_ID or "mock-project"
+    for key in REQUIRED:
+        VARIABLES[key] = VARIABLES.get(key) or f"mock-{key.lower()}"
+
+    ok = True
+    for label in ("first sync", "second sync (no changes)"):
+        MockRailwayHandler.calls = 0
+        MockRailwayHandler.connections = 0
+        started = time.perf_counter()
+        print(f"\n🧪 Mock {label}")
+        ok = sync(dry_run)[0] and ok
+        elapsed = time.perf_counter() - started
+        print(
+            f"⏱️  {MockRailwayHandler.calls} request(s) over "
+            f"{MockRailwayHandler.connections} new connection(s) in {elapsed * 1000:.1f} ms"
+        )
+
+    if not dry_run:
+        expected = {key: value for key, value in VARIABLES.items() if value is not None}
+        if MockRailwayHandler.store.get("mock-env") != expected:
+            print("❌ Mock store does not match VARIABLES")
+            ok = False
+    server.shutdown()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync Voice AI variables to Railway")
+    parser.add_argument("--dry-run", action="store_true", help="report the diff without writing")
+    parser.add_argument("--mock", action="store_true", help="run against a local mock GraphQL endpoint")
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="simulated latency per mock request (s)")
+    args = parser.parse_args()
+
+    if args.mock:
+        sys.exit(0 if run_mock(args.dry_run, args.mock_latency) else 1)
+
+    validate()
+    ok, written = sync(args.dry_run)
+    if not ok:
+        sys.exit(1)
+    if not written:
+        return
+
+    print("\nAcum mergi în Railway Dashboard și:")
+    print("1. Găsește serviciul web-production-f0714.up.railway.app")
+    print("2. Settings → Source → Root Directory: voice-backend")
+    print("3. Save")
+    print("\nRailway va redeploya automat!")
+
+
+if __name__ == "__main__":
+    main()
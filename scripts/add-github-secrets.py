@@ -1,29 +1,109 @@
 #!/usr/bin/env python3
 """
-Script pentru adăugarea GitHub secrets folosind GitHub API
+Script pentru sincronizarea GitHub secrets folosind GitHub API
 Necesită un Personal Access Token cu permisiuni 'repo' și 'admin:repo_hook'
+
+Manifest (JSON) - numele secretului și sursa valorii:
+  {
+    "KEYSTORE_BASE64": {"file": "/tmp/keystore_base64.txt"},
+    "KEYSTORE_PASSWORD": {"env": "KEYSTORE_PASSWORD"},
+    "SOME_FLAG": {"value": "true"}
+  }
+
+Exemple:
+  python3 scripts/add-github-secrets.py --manifest secrets.json
+  python3 scripts/add-github-secrets.py --dry-run
+  python3 scripts/add-github-secrets.py --mock   # test offline pe un API local
 """
 
+import argparse
+import base64
+import hashlib
+import hmac
+import json
 import os
+import secrets
 import sys
-import json
-import base64
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import requests
 from nacl import encoding, public
+from nacl.exceptions import CryptoError
 
 REPO_OWNER = "SuperPartyByAI"
 REPO_NAME = "Aplicatie-SuperpartyByAi"
+API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+# Starea stă în afara worktree-ului, ca să nu ajungă în git
+STATE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "superparty",
+    "github-secrets-state.json",
+)
+STATE_VERSION = 2
+MAX_RETRIES = 5
+# Cost scrypt pentru hash-urile din starea locală (~50 ms / secret)
+SCRYPT_PARAMS = {"n": 2 ** 14, "r": 8, "p": 1, "dklen": 32}
 
-def get_public_key(token):
-    """Obține cheia publică a repository-ului pentru criptarea secretelor"""
-    url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/actions/secrets/public-key"
-    headers = {
+# Secretele folosite de build-ul Android, când nu se dă --manifest
+DEFAULT_MANIFEST = {
+    "KEYSTORE_BASE64": {"file": "/tmp/keystore_base64.txt"},
+    "KEYSTORE_PASSWORD": {"value": "SuperParty2024!"},
+    "FIREBASE_SERVICE_ACCOUNT": {"file": "/tmp/firebase_service_account.json"},
+}
+
+def get_session(token, pool_size):
+    """Sesiune HTTP comună tuturor thread-urilor, cu un pool de pool_size conexiuni"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
         "Authorization": f"token {token}",
         "Accept": "application/vnd.github.v3+json"
-    }
-    response = requests.get(url, headers=headers)
+    })
+    return session
+
+
+def retry_delay(response, attempt):
+    """Secunde de așteptat din Retry-After / X-RateLimit-Reset, altfel backoff exponențial"""
+    try:
+        if "Retry-After" in response.headers:
+            return max(0.0, float(response.headers["Retry-After"]))
+        if "X-RateLimit-Reset" in response.headers:
+            return max(0.0, float(response.headers["X-RateLimit-Reset"]) - time.time())
+    except ValueError:
+        # Retry-After poate fi și o dată HTTP
+        pass
+    return 2 ** attempt
+
+
+def request_with_retry(session, method, url, **kwargs):
+    """Trimite cererea, reîncercând la rate limit (403/429) și erori 5xx"""
+    for attempt in range(MAX_RETRIES + 1):
+        response = session.request(method, url, timeout=30, **kwargs)
+        # 403 cu Retry-After = secondary rate limit (apare la PUT-uri în paralel)
+        rate_limited = response.status_code == 429 or (
+            response.status_code == 403 and (
+                "Retry-After" in response.headers
+                or response.headers.get("X-RateLimit-Remaining") == "0"
+            )
+        )
+        if attempt == MAX_RETRIES or not (rate_limited or response.status_code >= 500):
+            break
+        time.sleep(min(retry_delay(response, attempt), 60))
     response.raise_for_status()
-    return response.json()
+    return response
+
+
+def get_public_key(session, repo):
+    """Obține cheia publică a repository-ului pentru criptarea secretelor"""
+    url = f"{API_URL}/repos/{repo}/actions/secrets/public-key"
+    return request_with_retry(session, "GET", url).json()
+
 
 def encrypt_secret(public_key: str, secret_value: str) -> str:
     """Criptează un secret folosind cheia publică a repository-ului"""
@@ -32,83 +112,292 @@ def encrypt_secret(public_key: str, secret_value: str) -> str:
     encrypted = sealed_box.encrypt(secret_value.encode("utf-8"))
     return base64.b64encode(encrypted).decode("utf-8")
 
-def add_secret(token, secret_name, secret_value, key_id, public_key):
+
+def add_secret(session, repo, secret_name, secret_value, key_id, public_key):
     """Adaugă sau actualizează un secret în repository"""
-    url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/actions/secrets/{secret_name}"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    
-    encrypted_value = encrypt_secret(public_key, secret_value)
-    
+    url = f"{API_URL}/repos/{repo}/actions/secrets/{secret_name}"
     data = {
-        "encrypted_value": encrypted_value,
+        "encrypted_value": encrypt_secret(public_key, secret_value),
         "key_id": key_id
     }
-    
-    response = requests.put(url, headers=headers, json=data)
-    response.raise_for_status()
+    response = request_with_retry(session, "PUT", url, json=data)
     return response.status_code in [201, 204]
 
+
+def load_manifest(path):
+    if not path:
+        return DEFAULT_MANIFEST
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def resolve_value(name, source):
+    """Citește valoarea secretului din sursa declarată în manifest"""
+    if "file" in source:
+        with open(os.path.expanduser(source["file"]), "r") as f:
+            return f.read().strip()
+    if "env" in source:
+        value = os.environ.get(source["env"])
+        if value is None:
+            raise RuntimeError(f"{name}: variabila {source['env']} nu există în environment")
+        return value
+    if "value" in source:
+        return str(source["value"])
+    raise RuntimeError(f"{name}: sursă invalidă în manifest ({source})")
+
+
+def content_hash(salt, value):
+    """scrypt cu salt per secret: verificarea unei parole ghicite din starea locală e lentă"""
+    digest = hashlib.scrypt(value.encode("utf-8"), salt=bytes.fromhex(salt), **SCRYPT_PARAMS)
+    return digest.hex()
+
+
+def is_uploaded(entry, value, key_id):
+    """True dacă secretul a fost încărcat cu aceeași valoare și aceeași cheie publică"""
+    if not entry or entry.get("key_id") != key_id:
+        return False
+    return hmac.compare_digest(entry["hash"], content_hash(entry["salt"], value))
+
+
+def new_entry(value, key_id):
+    salt = secrets.token_hex(16)
+    return {"salt": salt, "hash": content_hash(salt, value), "key_id": key_id}
+
+
+def load_state(path):
+    """Citește starea; un fișier lipsă sau într-un format mai vechi o ia de la zero"""
+    state = {}
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            state = json.load(f)
+    if state.get("version") != STATE_VERSION:
+        state = {"version": STATE_VERSION, "repos": {}}
+    return state
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def sync(token, repo, manifest, state_path, workers=4, dry_run=False, force=False):
+    print(f"🔐 Sincronizare GitHub Secrets pentru {repo}...")
+    print("")
+
+    values = {name: resolve_value(name, source) for name, source in manifest.items()}
+
+    state = load_state(state_path)
+    repo_secrets = state["repos"].setdefault(repo, {})
+
+    session = get_session(token, workers)
+    print("🔑 Obțin cheia publică a repository-ului...")
+    key_data = get_public_key(session, repo)
+    key_id = key_data["key_id"]
+    public_key = key_data["key"]
+    print(f"✅ Cheie publică obținută (ID: {key_id})")
+    print("")
+
+    # Fiecare secret ține minte cheia cu care a fost criptat: o cheie nouă îl face pending
+    started = time.perf_counter()
+    pending = [
+        name for name in values
+        if force or not is_uploaded(repo_secrets.get(name), values[name], key_id)
+    ]
+    print(f"🔒 {len(values)} hash-uri verificate în {(time.perf_counter() - started) * 1000:.0f} ms")
+    for name in values:
+        print(f"  {'⬆️ ' if name in pending else '＝'} {name}")
+    print("")
+
+    if not pending:
+        print("✅ Toate secretele sunt la zi, nimic de încărcat")
+        return True
+    if dry_run:
+        print(f"📝 Dry run: {len(pending)} secret(e) ar fi încărcate")
+        return True
+
+    def upload(name):
+        add_secret(session, repo, name, values[name], key_id, public_key)
+        return new_entry(values[name], key_id)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload, name): name for name in pending}
+        for future, name in futures.items():
+            try:
+                repo_secrets[name] = future.result()
+                print(f"✅ {name} adăugat")
+            except requests.exceptions.HTTPError as e:
+                failed.append(name)
+                print(f"❌ {name}: Eroare HTTP: {e}")
+                print(f"Response: {e.response.text}")
+            except (requests.exceptions.RequestException, CryptoError) as e:
+                failed.append(name)
+                print(f"❌ {name}: Eroare: {e}")
+
+    save_state(state_path, state)
+
+    print("")
+    if failed:
+        print(f"❌ {len(failed)} secret(e) nu au putut fi adăugate: {', '.join(failed)}")
+        return False
+    print("✅ Toate secretele au fost adăugate cu succes!")
+    return True
+
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+    """Înlocuitor local pentru endpoint-urile GitHub Actions secrets"""
+
+    # Keep-alive, ca sesiunea comună să reutilizeze conexiunile
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    private_key = public.PrivateKey.generate()
+    secrets = {}
+    calls = 0
+    connections = 0
+    rate_limit_every = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with self.lock:
+            type(self).connections += 1
+        super().setup()
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body=None, headers=None):
+        encoded = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _rate_limited(self):
+        cls = type(self)
+        with cls.lock:
+            cls.calls += 1
+            return cls.rate_limit_every and cls.calls % cls.rate_limit_every == 0
+
+    def _rate_limit_response(self):
+        # Ca secondary rate limit-ul GitHub: 403 cu Retry-After, deși mai există cotă
+        headers = {"Retry-After": "0", "X-RateLimit-Remaining": "4999"}
+        return self._send(403, {"message": "You have exceeded a secondary rate limit."}, headers)
+
+    def do_GET(self):
+        if self._rate_limited():
+            return self._rate_limit_response()
+        if self.path.endswith("/actions/secrets/public-key"):
+            key = self.private_key.public_key.encode(encoding.Base64Encoder()).decode("utf-8")
+            return self._send(200, {"key_id": "mock-key", "key": key})
+        self._send(404, {"message": "Not Found"})
+
+    def do_PUT(self):
+        # Corpul se citește mereu, altfel rămâne în conexiunea keep-alive
+        raw = self._read_body()
+        if self._rate_limited():
+            return self._rate_limit_response()
+        data = json.loads(raw or b"{}")
+        name = self.path.rsplit("/", 1)[-1]
+        box = public.SealedBox(self.private_key)
+        value = box.decrypt(base64.b64decode(data["encrypted_value"])).decode("utf-8")
+        with self.lock:
+            existed = name in self.secrets
+            self.secrets[name] = value
+        self._send(204 if existed else 201)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    # Coada implicită (5) pierde conexiuni la --workers 8 și strică măsurătorile
+    request_queue_size = 128
+
+
+def run_mock(args):
+    """Rulează sincronizarea de două ori pe un API local, cu număr de cereri și timp"""
+    global API_URL
+    MockGitHubHandler.rate_limit_every = args.mock_rate_limit
+    server = MockServer(("127.0.0.1", 0), MockGitHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    API_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+    if args.manifest:
+        manifest = load_manifest(args.manifest)
+    else:
+        manifest = {f"MOCK_SECRET_{i}": {"value": f"value-{i}"} for i in range(20)}
+
+    # Starea mock-ului e mereu temporară; fișierul din --state nu e atins
+    ok = True
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_path = os.path.join(tmp_dir, "state.json")
+            for label in ("prima sincronizare", "a doua sincronizare (fără modificări)"):
+                MockGitHubHandler.calls = 0
+                MockGitHubHandler.connections = 0
+                started = time.perf_counter()
+                print(f"\n🧪 Mock {label}")
+                ok = sync("mock-token", args.repo, manifest, state_path, args.workers, args.dry_run, args.force) and ok
+                elapsed = time.perf_counter() - started
+                print(
+                    f"⏱️  {MockGitHubHandler.calls} cerere(i) pe "
+                    f"{MockGitHubHandler.connections} conexiune(i) noi în {elapsed * 1000:.1f} ms"
+                )
+    finally:
+        server.shutdown()
+
+    if not args.dry_run:
+        mismatched = [name for name in manifest if MockGitHubHandler.secrets.get(name) != resolve_value(name, manifest[name])]
+        if mismatched:
+            print(f"❌ Valori decriptate greșit: {', '.join(mismatched)}")
+            ok = False
+    return ok
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Sincronizează GitHub Actions secrets dintr-un manifest")
+    parser.add_argument("--manifest", help="fișier JSON cu numele secretelor și sursele lor")
+    parser.add_argument("--repo", default=f"{REPO_OWNER}/{REPO_NAME}", help="owner/name")
+    parser.add_argument("--state", default=STATE_FILE, help="fișier local cu hash-urile încărcate")
+    parser.add_argument("--workers", type=int, default=4, help="upload-uri în paralel")
+    parser.add_argument("--dry-run", action="store_true", help="doar raport, fără upload")
+    parser.add_argument("--force", action="store_true", help="ignoră fișierul de stare")
+    parser.add_argument("--mock", action="store_true", help="rulează pe un API GitHub local")
+    parser.add_argument("--mock-rate-limit", type=int, default=0, help="mock: rate limit secundar (403) la fiecare a N-a cerere")
+    args = parser.parse_args()
+
     # Verifică dacă există token
     token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
-    
-    if not token:
-        print("❌ Eroare: Nu există GITHUB_TOKEN sau GH_TOKEN în environment")
-        print("")
-        print("📋 Pentru a adăuga secretele manual:")
-        print("1. Mergi la: https://github.com/SuperPartyByAI/Aplicatie-SuperpartyByAi/settings/secrets/actions")
-        print("2. Click 'New repository secret'")
-        print("3. Adaugă următoarele secrete:")
-        print("")
-        print("   KEYSTORE_BASE64:")
-        with open("/tmp/keystore_base64.txt", "r") as f:
-            print(f"   {f.read()[:100]}...")
-        print("")
-        print("   KEYSTORE_PASSWORD:")
-        print("   SuperParty2024!")
-        print("")
-        print("   FIREBASE_SERVICE_ACCOUNT:")
-        with open("/tmp/firebase_service_account.json", "r") as f:
-            print(f"   {f.read()[:100]}...")
-        sys.exit(1)
-    
+
     try:
-        print("🔐 Adăugare GitHub Secrets...")
-        print("")
-        
-        # Obține cheia publică
-        print("🔑 Obțin cheia publică a repository-ului...")
-        key_data = get_public_key(token)
-        key_id = key_data["key_id"]
-        public_key = key_data["key"]
-        print(f"✅ Cheie publică obținută (ID: {key_id})")
-        print("")
-        
-        # 1. KEYSTORE_BASE64
-        print("📦 Adăugare KEYSTORE_BASE64...")
-        with open("/tmp/keystore_base64.txt", "r") as f:
-            keystore_base64 = f.read().strip()
-        add_secret(token, "KEYSTORE_BASE64", keystore_base64, key_id, public_key)
-        print("✅ KEYSTORE_BASE64 adăugat")
-        
-        # 2. KEYSTORE_PASSWORD
-        print("🔑 Adăugare KEYSTORE_PASSWORD...")
-        add_secret(token, "KEYSTORE_PASSWORD", "SuperParty2024!", key_id, public_key)
-        print("✅ KEYSTORE_PASSWORD adăugat")
-        
-        # 3. FIREBASE_SERVICE_ACCOUNT
-        print("🔥 Adăugare FIREBASE_SERVICE_ACCOUNT...")
-        with open("/tmp/firebase_service_account.json", "r") as f:
-            firebase_sa = f.read().strip()
-        add_secret(token, "FIREBASE_SERVICE_ACCOUNT", firebase_sa, key_id, public_key)
-        print("✅ FIREBASE_SERVICE_ACCOUNT adăugat")
-        
-        print("")
-        print("✅ Toate secretele au fost adăugate cu succes!")
-        
+        manifest = load_manifest(args.manifest)
+
+        if not token and not args.mock:
+            print("❌ Eroare: Nu există GITHUB_TOKEN sau GH_TOKEN în environment")
+            print("")
+            print("📋 Pentru a adăuga secretele manual:")
+            print(f"1. Mergi la: https://github.com/{args.repo}/settings/secrets/actions")
+            print("2. Click 'New repository secret'")
+            print("3. Adaugă următoarele secrete:")
+            print("")
+            for name, source in manifest.items():
+                print(f"   {name}: {json.dumps(source)}")
+            sys.exit(1)
+
+        if args.mock:
+            ok = run_mock(args)
+        else:
+            ok = sync(token, args.repo, manifest, args.state, args.workers, args.dry_run, args.force)
+        if not ok:
+            sys.exit(1)
     except requests.exceptions.HTTPError as e:
         print(f"❌ Eroare HTTP: {e}")
         print(f"Response: {e.response.text}")
@@ -117,5 +406,6 @@ def main():
         print(f"❌ Eroare: {e}")
         sys.exit(1)
 
+
 if __name__ == "__main__":
     main()